@@ -0,0 +1,121 @@
+import asyncio
+import functools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import database, stats
+
+DEFAULT_READERS = 4
+DEFAULT_BATCH_SIZE = 500
+
+def _reader(func):
+    """Wraps a blocking read function so it runs on the reader thread pool."""
+    @functools.wraps(func)
+    async def method(self, *args, **kwargs):
+        return await self._submit(self._readers, func, *args, **kwargs)
+    method.__doc__ = f"Async version of {func.__module__}.{func.__name__}: {func.__doc__}"
+    return method
+
+def _writer(func):
+    """Wraps a blocking write function so it runs on the single writer thread."""
+    @functools.wraps(func)
+    async def method(self, *args, **kwargs):
+        return await self._submit(self._writer_pool, func, *args, **kwargs)
+    method.__doc__ = f"Async version of {func.__module__}.{func.__name__}: {func.__doc__}"
+    return method
+
+class AsyncRunThing:
+    """Async access to the RunThing database for use inside asyncio services.
+
+    Reads run on a pool of reader threads and writes on a single writer thread, each
+    thread keeping one connection open for its lifetime, so blocking sqlite3 calls
+    never stall the event loop. Pass wal=True to switch the database to WAL mode so
+    readers are not blocked by writers; this permanently changes the database file.
+    Use as an async context manager:
+
+        async with AsyncRunThing() as db:
+            runs = await db.get_runs_by_date_range('2024-01-01', '2024-01-31')
+    """
+
+    def __init__(self, readers=DEFAULT_READERS, db_path=None, wal=False):
+        self.db_path = db_path or database.get_db_path()
+        if wal:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            finally:
+                conn.close()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='runthing-reader', initializer=self._pin_connection)
+        self._writer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='runthing-writer', initializer=self._pin_connection)
+
+    def _pin_connection(self):
+        conn = database.pin_connection(self.db_path)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    async def _submit(self, executor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    async def close(self):
+        """Waits for pending work to finish and closes every worker connection."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._shutdown)
+
+    def _shutdown(self):
+        self._writer_pool.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.release()
+            self._connections.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def iter_runs(self, batch_size=DEFAULT_BATCH_SIZE):
+        """Asynchronously iterates over all runs in ID order, fetching them in batches."""
+        last_id = 0
+        while True:
+            runs = await self._submit(self._readers, database.get_runs_after_id, last_id, batch_size)
+            for run in runs:
+                yield run
+            if len(runs) < batch_size:
+                return
+            last_id = runs[-1]['id']
+
+    # Reads
+    get_runs_by_date_range = _reader(database.get_runs_by_date_range)
+    get_run_by_id = _reader(database.get_run_by_id)
+    get_runs_after_id = _reader(database.get_runs_after_id)
+    count_runs = _reader(database.count_runs)
+    get_monthly_summary = _reader(database.get_monthly_summary)
+    get_fastest_run_for_distance = _reader(database.get_fastest_run_for_distance)
+    get_last_n_runs = _reader(database.get_last_n_runs)
+    get_last_two_runs = _reader(database.get_last_two_runs)
+    get_run_days = _reader(database.get_run_days)
+    get_first_run_day = _reader(database.get_first_run_day)
+    get_total_distance = _reader(stats.get_total_distance)
+    get_total_time = _reader(stats.get_total_time)
+    get_average_pace = _reader(stats.get_average_pace)
+    get_cumulative_progress = _reader(stats.get_cumulative_progress)
+    predict_performance = _reader(stats.predict_performance)
+    get_best_efforts = _reader(stats.get_best_efforts)
+    get_day_bitmap = _reader(stats.get_day_bitmap)
+    get_streaks = _reader(stats.get_streaks)
+    get_heatmap = _reader(stats.get_heatmap)
+
+    # Writes
+    init_db = _writer(database.init_db)
+    add_run = _writer(database.add_run)
+    delete_run = _writer(database.delete_run)
+    update_run = _writer(database.update_run)
+    delete_runs = _writer(database.delete_runs)
+    bulk_update_runs = _writer(database.bulk_update_runs)
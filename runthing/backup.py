@@ -0,0 +1,234 @@
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from .database import connect_db, get_db_path, get_change_seq
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+BACKUP_PAGES_PER_STEP = 256  # Pages copied per backup step before yielding to other connections
+BACKUP_STEP_SLEEP = 0.005  # Seconds to sleep between steps so writers are not starved
+COPY_CHUNK_SIZE = 1024 * 1024
+BACKUP_STATE_SUFFIX = '-backup.json'
+COMPRESSIONS = ('gzip', 'zstd', 'none')
+
+def get_backup_state_path():
+    """Returns the path of the file that records the last backup's change sequence number."""
+    return get_db_path() + BACKUP_STATE_SUFFIX
+
+def load_backup_state():
+    """Loads the state of the last backup, or an empty state if none was taken yet."""
+    try:
+        with open(get_backup_state_path()) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_backup_state(state):
+    """Saves the state of the last backup."""
+    with open(get_backup_state_path(), 'w') as f:
+        json.dump(state, f)
+
+def _open_compressed(path, mode, compression):
+    """Opens a file object that transparently compresses or decompresses with the given method."""
+    if compression == 'gzip':
+        return gzip.open(path, mode)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package.")
+        raw = open(path, mode)
+        if 'w' in mode:
+            return zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    if compression == 'none':
+        return open(path, mode)
+    raise ValueError(f"Unknown compression: {compression}")
+
+def detect_compression(path):
+    """Detects the compression of a backup file from its magic bytes."""
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic[:2] == b'\x1f\x8b':
+        return 'gzip'
+    if magic == b'\x28\xb5\x2f\xfd':
+        return 'zstd'
+    return 'none'
+
+def _write_backup_info(conn, kind, base_seq, high_water_seq):
+    """Records what a backup file contains so restore knows how to apply it.
+
+    base_seq is the change sequence number an incremental backup builds on (0 for full backups).
+    """
+    conn.execute("DROP TABLE IF EXISTS backup_info")
+    conn.execute("CREATE TABLE backup_info (kind TEXT NOT NULL, base_seq INTEGER NOT NULL, high_water_seq INTEGER NOT NULL)")
+    conn.execute("INSERT INTO backup_info (kind, base_seq, high_water_seq) VALUES (?, ?, ?)", (kind, base_seq, high_water_seq))
+    conn.commit()
+
+def _make_temp_file(near):
+    """Creates a temporary database file in the same directory as `near`."""
+    fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(os.path.abspath(near)))
+    os.close(fd)
+    return tmp_path
+
+def _copy_database(source, target):
+    """Copies one database into another in page-stepped increments."""
+    source.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+
+def _copy_changes(source, target, since_seq):
+    """Copies the runs changed and the IDs of runs deleted since a change sequence number.
+
+    Runs in a single read transaction so the rows match the returned high-water sequence number.
+    """
+    target.execute("""
+        CREATE TABLE runs (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            distance REAL NOT NULL,
+            time INTEGER NOT NULL,
+            pace REAL,
+            notes TEXT
+        )
+    """)
+    target.execute("CREATE TABLE deleted_runs (id INTEGER PRIMARY KEY)")
+
+    source.execute("BEGIN")
+    try:
+        high_water_seq = get_change_seq(source)
+        cursor = source.execute("""
+            SELECT c.run_id, c.deleted, r.date, r.distance, r.time, r.pace, r.notes
+            FROM run_changes c LEFT JOIN runs r ON r.id = c.run_id
+            WHERE c.seq > ? AND c.seq <= ?
+        """, (since_seq, high_water_seq))
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            target.executemany("INSERT INTO runs (id, date, distance, time, pace, notes) VALUES (?, ?, ?, ?, ?, ?)",
+                               [(row[0],) + tuple(row[2:]) for row in rows if not row[1]])
+            target.executemany("INSERT INTO deleted_runs (id) VALUES (?)", [(row[0],) for row in rows if row[1]])
+        target.commit()
+    finally:
+        source.rollback()
+    return high_water_seq
+
+def backup_database(filename, compression='gzip', incremental=False):
+    """Backs up the database to a compressed file without blocking other users.
+
+    A full backup copies the whole database through SQLite's online backup API.
+    An incremental backup only contains the runs added or edited, and the IDs of the
+    runs deleted, since the change sequence number recorded by the last backup. The
+    copy is staged uncompressed next to `filename` and compressed into a temporary
+    file that only replaces `filename` once complete.
+    Returns (kind, number of runs, number of deleted runs).
+    """
+    state = load_backup_state()
+    tmp_path = _make_temp_file(filename)
+    partial_path = None
+    source = connect_db()
+    target = sqlite3.connect(tmp_path)
+    try:
+        if incremental and ('high_water_seq' not in state or get_change_seq(source) is None):
+            incremental = False  # No previous backup to build on, or no change log (run 'init')
+
+        if incremental:
+            kind = 'incremental'
+            since_seq = state['high_water_seq']
+            high_water_seq = _copy_changes(source, target, since_seq)
+            deleted_count = target.execute("SELECT COUNT(*) FROM deleted_runs").fetchone()[0]
+        else:
+            kind = 'full'
+            since_seq = 0
+            _copy_database(source, target)
+            high_water_seq = get_change_seq(target) or 0
+            deleted_count = 0
+
+        run_count = target.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        _write_backup_info(target, kind, since_seq, high_water_seq)
+
+        partial_path = _make_temp_file(filename)
+        with open(tmp_path, 'rb') as src, _open_compressed(partial_path, 'wb', compression) as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        os.replace(partial_path, filename)
+        partial_path = None
+    finally:
+        target.close()
+        source.close()
+        os.remove(tmp_path)
+        if partial_path is not None:
+            os.remove(partial_path)
+
+    save_backup_state({'high_water_seq': high_water_seq, 'kind': kind, 'file': os.path.abspath(filename)})
+    return kind, run_count, deleted_count
+
+def restore_database(filename):
+    """Restores the database from a backup file created by backup_database.
+
+    A full backup replaces the whole database. An incremental backup must build on the
+    database's current change sequence number; its runs are merged into the database
+    and its deleted runs removed. The backup state is reset to the restored sequence
+    number so later incremental backups continue the chain.
+    Returns (kind, number of runs, number of deleted runs).
+    """
+    compression = detect_compression(filename)
+    tmp_path = _make_temp_file(get_db_path())
+    try:
+        with _open_compressed(filename, 'rb', compression) as src, open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
+        source = sqlite3.connect(tmp_path)
+        try:
+            try:
+                kind, base_seq, high_water_seq = source.execute("SELECT kind, base_seq, high_water_seq FROM backup_info").fetchone()
+            except sqlite3.DatabaseError:
+                raise ValueError(f"{filename} is not a RunThing backup.")
+            run_count = source.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            deleted_count = source.execute("SELECT COUNT(*) FROM deleted_runs").fetchone()[0] if kind == 'incremental' else 0
+        finally:
+            source.close()
+
+        conn = connect_db()
+        try:
+            if kind == 'full':
+                source = sqlite3.connect(tmp_path)
+                try:
+                    _copy_database(source, conn)
+                finally:
+                    source.close()
+                conn.execute("DROP TABLE backup_info")
+                conn.commit()
+            else:
+                current_seq = get_change_seq(conn)
+                if current_seq is None:
+                    raise ValueError("The database has no change log. Run 'init' and restore a full backup first.")
+                if current_seq != base_seq:
+                    raise ValueError(f"{filename} builds on change {base_seq} but the database is at change {current_seq}. "
+                                     "Restore the full backup and the earlier incremental backups it builds on first.")
+                conn.execute("ATTACH DATABASE ? AS incoming", (tmp_path,))
+                try:
+                    with conn:
+                        conn.execute("""
+                            INSERT INTO runs (id, date, distance, time, pace, notes)
+                            SELECT id, date, distance, time, pace, notes FROM incoming.runs WHERE true
+                            ON CONFLICT(id) DO UPDATE SET
+                                date = excluded.date, distance = excluded.distance, time = excluded.time,
+                                pace = excluded.pace, notes = excluded.notes
+                        """)
+                        conn.execute("DELETE FROM runs WHERE id IN (SELECT id FROM incoming.deleted_runs)")
+                        # The triggers logged the merge as new changes; stamp them with the backup's
+                        # sequence number so the database matches the point the backup was taken.
+                        conn.execute("UPDATE run_changes SET seq = ? WHERE seq > ?", (high_water_seq, base_seq))
+                finally:
+                    conn.execute("DETACH DATABASE incoming")
+        finally:
+            conn.close()
+    finally:
+        os.remove(tmp_path)
+
+    save_backup_state({'high_water_seq': high_water_seq, 'kind': kind, 'file': os.path.abspath(filename)})
+    return kind, run_count, deleted_count
@@ -1,8 +1,11 @@
 import click
 import datetime
-from .stats import get_total_distance, get_total_time, get_average_pace, predict_performance, get_best_efforts, compare_runs
-from .database import init_db, connect_db, delete_run, get_runs_by_date_range, get_run_by_id, update_run, get_monthly_summary, get_last_two_runs
+import sqlite3
+from .stats import get_total_distance, get_total_time, get_average_pace, predict_performance, get_best_efforts, compare_runs, get_streaks, get_heatmap
+from .database import init_db, connect_db, add_run, delete_run, get_runs_by_date_range, get_run_by_id, update_run, get_monthly_summary, get_last_two_runs, build_run_filter, delete_runs, bulk_update_runs
 from .pdf_generator import generate_run_report_pdf
+from .backup import backup_database, restore_database, COMPRESSIONS
+from .integrity import check_database, repair_issues, CHUNK_SIZE
 from .utils import convert_to_display_date, convert_to_db_date
 
 @click.group()
@@ -65,19 +68,11 @@ def log(date, distance, time, pace, notes):
     elif notes == '': # If notes was provided as an empty string argument
         notes = None
 
-    conn = connect_db()
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            INSERT INTO runs (date, distance, time, pace, notes)
-            VALUES (?, ?, ?, ?, ?)
-        """, (db_date, distance, total_seconds, pace, notes))
-        conn.commit()
+        add_run(db_date, distance, total_seconds, pace, notes)
         click.echo(f"Run logged successfully on {convert_to_display_date(db_date)}: {distance} km in {time} (Pace: {pace:.2f} min/km).")
     except Exception as e:
         click.echo(f"Error logging run: {e}")
-    finally:
-        conn.close()
 
 @cli.command()
 def list_runs():
@@ -218,20 +213,19 @@ def edit(run_id):
     new_total_seconds = hours * 3600 + minutes * 60 + seconds
 
     click.echo(f"Current Pace: {run['pace']:.2f} min/km")
-    new_pace = click.prompt('New Pace (min/km) (leave blank to recalculate)', type=float, default=run['pace'], show_default=False)
-    if new_pace == run['pace'] and new_pace == '': # If user left blank and it was already blank
+    new_pace = click.prompt('New Pace (min/km) (leave blank to recalculate)', default='', show_default=False)
+    if new_pace == '': # If user left blank, recalculate from the new time and distance
         if new_distance > 0:
             new_pace = (new_total_seconds / 60) / new_distance
             click.echo(f"Recalculated pace: {new_pace:.2f} min/km")
         else:
             click.echo("Error: Distance must be greater than 0 to calculate pace.")
             return
-    elif new_pace == '': # If user left blank and it had a value, recalculate
-        if new_distance > 0:
-            new_pace = (new_total_seconds / 60) / new_distance
-            click.echo(f"Recalculated pace: {new_pace:.2f} min/km")
-        else:
-            click.echo("Error: Distance must be greater than 0 to calculate pace.")
+    else:
+        try:
+            new_pace = float(new_pace)
+        except ValueError:
+            click.echo("Error: Pace must be a number.")
             return
 
     click.echo(f"Current Notes: {run['notes'] if run['notes'] else ''}")
@@ -247,6 +241,101 @@ def edit(run_id):
     except Exception as e:
         click.echo(f"Error updating run: {e}")
 
+def run_filter_options(command):
+    """Adds the options used to select a set of runs for bulk operations."""
+    command = click.option('--end-date', default=None, help='Only runs on or before this date (DD-MM-YYYY).')(command)
+    command = click.option('--start-date', default=None, help='Only runs on or after this date (DD-MM-YYYY).')(command)
+    command = click.option('--id-range', default=None, help='Inclusive range of run IDs, e.g. 10-20.')(command)
+    command = click.option('--ids', default=None, help='Comma-separated list of run IDs, e.g. 1,2,5.')(command)
+    return command
+
+def parse_run_filter(ids, id_range, start_date, end_date):
+    """Turns bulk filter options into a WHERE clause. Returns None after reporting an error."""
+    try:
+        id_list = [int(p) for p in ids.split(',') if p.strip()] if ids is not None else None
+        id_bounds = tuple(int(p) for p in id_range.split('-')) if id_range is not None else None
+    except ValueError:
+        click.echo("Error: IDs must be integers, e.g. --ids 1,2,5 or --id-range 10-20.")
+        return None
+    if id_list is not None and not id_list:
+        click.echo("Error: --ids must list at least one run ID.")
+        return None
+    if id_bounds is not None and len(id_bounds) != 2:
+        click.echo("Error: ID range must be in the form START-END.")
+        return None
+    if id_bounds is not None and id_bounds[0] > id_bounds[1]:
+        click.echo("Error: ID range start must not be greater than its end.")
+        return None
+
+    db_start_date = convert_to_db_date(start_date) if start_date else None
+    db_end_date = convert_to_db_date(end_date) if end_date else None
+    try:
+        # Validate date formats
+        for db_date in (db_start_date, db_end_date):
+            if db_date:
+                datetime.date.fromisoformat(db_date)
+    except ValueError:
+        click.echo("Error: Date format must be DD-MM-YYYY.")
+        return None
+
+    if not any((id_list, id_bounds, db_start_date, db_end_date)):
+        click.echo("Error: Provide at least one of --ids, --id-range, --start-date or --end-date.")
+        return None
+
+    return build_run_filter(id_list, id_bounds, db_start_date, db_end_date)
+
+@cli.command()
+@run_filter_options
+@click.option('--dry-run', is_flag=True, help='Only show how many runs would be deleted.')
+@click.option('--force', is_flag=True, help='Do not ask for confirmation.')
+def bulk_delete(ids, id_range, start_date, end_date, dry_run, force):
+    """Deletes all runs matching the given IDs, ID range and/or date range."""
+    run_filter = parse_run_filter(ids, id_range, start_date, end_date)
+    if run_filter is None:
+        return
+    where, params = run_filter
+
+    count = delete_runs(where, params, dry_run=True)
+    if dry_run or count == 0:
+        click.echo(f"{count} runs would be deleted.")
+        return
+
+    if force or click.confirm(f"Are you sure you want to delete {count} runs?", abort=True):
+        try:
+            deleted = delete_runs(where, params)
+            click.echo(f"{deleted} runs deleted successfully.")
+        except Exception as e:
+            click.echo(f"Error deleting runs: {e}")
+
+@cli.command()
+@run_filter_options
+@click.option('--recompute-pace', is_flag=True, help='Recalculate pace from time and distance.')
+@click.option('--shift-days', type=int, default=0, help='Move run dates by this many days (negative to move back).')
+@click.option('--dry-run', is_flag=True, help='Only show how many runs would be updated.')
+@click.option('--force', is_flag=True, help='Do not ask for confirmation.')
+def bulk_edit(ids, id_range, start_date, end_date, recompute_pace, shift_days, dry_run, force):
+    """Applies a correction to all runs matching the given IDs, ID range and/or date range."""
+    if not recompute_pace and not shift_days:
+        click.echo("Error: Provide --recompute-pace and/or --shift-days.")
+        return
+
+    run_filter = parse_run_filter(ids, id_range, start_date, end_date)
+    if run_filter is None:
+        return
+    where, params = run_filter
+
+    count = bulk_update_runs(where, params, recompute_pace, shift_days, dry_run=True)
+    if dry_run or count == 0:
+        click.echo(f"{count} runs would be updated.")
+        return
+
+    if force or click.confirm(f"Are you sure you want to update {count} runs?", abort=True):
+        try:
+            updated = bulk_update_runs(where, params, recompute_pace, shift_days)
+            click.echo(f"{updated} runs updated successfully.")
+        except Exception as e:
+            click.echo(f"Error updating runs: {e}")
+
 @cli.command()
 @click.argument('target_distance', type=float, required=False)
 @click.option('--recent-runs', type=int, default=None, help='Number of most recent runs to consider for prediction.')
@@ -327,6 +416,54 @@ def stats():
             click.echo(f"{distance:.1f} km: {time_str} (Pace: {run['pace']:.2f} min/km) on {convert_to_display_date(run['date'])}")
         click.echo("-----------------------------------")
 
+@cli.command()
+def streaks():
+    """Displays current and longest running streaks."""
+    try:
+        streak_data = get_streaks()
+    except sqlite3.OperationalError as e:
+        click.echo(f"Error calculating streaks: {e}. Run 'init' to update the database.")
+        return
+    if streak_data is None:
+        click.echo("No runs logged yet to calculate streaks.")
+        return
+
+    click.echo("\n--- Streaks ---")
+    click.echo(f"Current Streak: {streak_data['current_streak']} days")
+    click.echo(f"Longest Streak: {streak_data['longest_streak']} days")
+    click.echo(f"Current Weekly Streak: {streak_data['current_weekly_streak']} weeks")
+    click.echo(f"Longest Weekly Streak: {streak_data['longest_weekly_streak']} weeks")
+    click.echo(f"Longest Gap: {streak_data['longest_gap']} days")
+    click.echo("---------------")
+
+@cli.command()
+@click.argument('year', type=int, required=False)
+def heatmap(year):
+    """Displays a heatmap of the distance run each day of a year. Defaults to the current year."""
+    if year is None:
+        year = datetime.date.today().year
+
+    try:
+        matrix = get_heatmap(year)
+    except sqlite3.OperationalError as e:
+        click.echo(f"Error building heatmap: {e}. Run 'init' to update the database.")
+        return
+    max_distance = max((d for row in matrix for d in row if d), default=0)
+    levels = '.-+*#' # No run, then quarters of the longest day's distance
+
+    click.echo(f"\n--- {year} Heatmap (max {max_distance:.2f} km/day) ---")
+    for weekday, row in zip(('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'), matrix):
+        cells = []
+        for distance in row:
+            if distance is None:
+                cells.append(' ')
+            elif distance <= 0:
+                cells.append(levels[0])
+            else:
+                cells.append(levels[min(4, 1 + int(4 * distance / max_distance))])
+        click.echo(f"{weekday} {''.join(cells)}")
+    click.echo("-" * 40)
+
 @cli.command()
 @click.option('--filename', default='run_report.pdf', help='Name of the PDF file to generate.')
 def pdf(filename):
@@ -363,6 +500,75 @@ def compare():
     else:
         click.echo(f"Improvement: {abs(improvement):.2f}% faster.")
 
+@cli.command()
+@click.option('--filename', default=None, help='Name of the backup file. Defaults to a timestamped name.')
+@click.option('--compression', type=click.Choice(COMPRESSIONS), default='gzip', help='Compression to apply to the backup.')
+@click.option('--incremental', is_flag=True, help='Only back up runs added, edited or deleted since the last backup.')
+def backup(filename, compression, incremental):
+    """Backs up the database without blocking other users."""
+    if filename is None:
+        extension = {'gzip': '.db.gz', 'zstd': '.db.zst', 'none': '.db'}[compression]
+        filename = f"runthing-backup-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}{extension}"
+
+    try:
+        kind, run_count, deleted_count = backup_database(filename, compression, incremental)
+        if kind == 'incremental':
+            click.echo(f"Incremental backup of {run_count} changed runs and {deleted_count} deleted runs written to {filename}.")
+        else:
+            if incremental:
+                click.echo("No previous backup to build on (or the database needs 'init'); taking a full backup.")
+            click.echo(f"Full backup of {run_count} runs written to {filename}.")
+    except Exception as e:
+        click.echo(f"Error backing up database: {e}")
+
+@cli.command()
+@click.argument('filename', type=click.Path(exists=True, dir_okay=False))
+@click.option('--force', is_flag=True, help='Do not ask for confirmation.')
+def restore(filename, force):
+    """Restores the database from a backup file."""
+    if force or click.confirm(f"Restoring from {filename} may overwrite existing runs. Continue?", abort=True):
+        try:
+            kind, run_count, deleted_count = restore_database(filename)
+            if kind == 'incremental':
+                click.echo(f"Restored {run_count} changed runs and {deleted_count} deletions from incremental backup {filename}.")
+            else:
+                click.echo(f"Restored {run_count} runs from full backup {filename}.")
+        except Exception as e:
+            click.echo(f"Error restoring database: {e}")
+
+@cli.command()
+@click.option('--repair', is_flag=True, help='Fix inconsistent paces and malformed dates where possible.')
+@click.option('--workers', type=click.IntRange(min=1), default=None, help='Number of worker processes. Defaults to the number of CPUs.')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=CHUNK_SIZE, help='Number of runs checked per worker task.')
+def fsck(repair, workers, chunk_size):
+    """Checks every run for inconsistent paces, malformed dates and impossible values."""
+    try:
+        issues = check_database(workers, chunk_size)
+    except Exception as e:
+        click.echo(f"Error checking database: {e}")
+        return
+
+    if not issues:
+        click.echo("No problems found.")
+        return
+
+    click.echo("\n--- Problems Found ---")
+    for run_id, problem, fixes, _ in issues:
+        fix_str = "" if fixes else " (cannot be repaired automatically)"
+        click.echo(f"ID: {run_id}: {problem}{fix_str}")
+    click.echo("----------------------")
+
+    fixable = sum(1 for issue in issues if issue[2])
+    click.echo(f"{len(issues)} problems found, {fixable} can be repaired automatically.")
+    if repair and fixable:
+        try:
+            repaired = repair_issues(issues)
+            click.echo(f"{repaired} fixes applied.")
+        except Exception as e:
+            click.echo(f"Error repairing database: {e}")
+    elif fixable:
+        click.echo("Run with --repair to fix them.")
+
 
 if __name__ == '__main__':
     cli()
\ No newline at end of file
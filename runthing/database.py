@@ -1,21 +1,49 @@
 import sqlite3
 import os
+import json
+import threading
 
 DATABASE_FILE = 'runs.db'
 
+_local = threading.local()
+
+class PinnedConnection(sqlite3.Connection):
+    """A connection reused by every connect_db call on its thread. close() leaves it open; use release()."""
+
+    def close(self):
+        pass
+
+    def release(self):
+        super().close()
+
 def get_db_path():
     """Returns the absolute path to the database file."""
     return os.path.join(os.getcwd(), DATABASE_FILE)
 
+def pin_connection(db_path=None):
+    """Opens a connection that connect_db returns on the current thread for the rest of its life."""
+    # Only the pinning thread uses the connection, but another thread may release it on shutdown.
+    conn = sqlite3.connect(db_path or get_db_path(), factory=PinnedConnection, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    _local.conn = conn
+    return conn
+
 def connect_db():
     """Establishes a connection to the SQLite database."""
+    pinned = getattr(_local, 'conn', None)
+    if pinned is not None:
+        return pinned
     db_path = get_db_path()
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row  # This allows accessing columns by name
     return conn
 
 def init_db():
-    """Initializes the database by creating the 'runs' table if it doesn't exist."""
+    """Initializes the database by creating the 'runs' table if it doesn't exist.
+
+    Also migrates databases created by earlier versions by adding any missing
+    derived tables, so it is safe to run again after upgrading.
+    """
     with connect_db() as conn:
         cursor = conn.cursor()
         cursor.execute("""
@@ -29,6 +57,114 @@ def init_db():
             )
         """)
         conn.commit()
+        ensure_calendar(conn)
+        ensure_change_log(conn)
+
+def ensure_calendar(conn):
+    """Creates the per-day calendar table and the triggers that keep it in sync with 'runs'.
+
+    The calendar holds one row per day with runs, so streaks and heatmaps only need to
+    read the days in the requested range. Existing runs are backfilled the first time.
+    Called from init_db only; read paths assume the calendar exists.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'run_calendar'").fetchone()
+    if exists:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS run_calendar (
+                day TEXT PRIMARY KEY,
+                run_count INTEGER NOT NULL,
+                distance REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute("DELETE FROM run_calendar") # Another connection may have raced us here
+        conn.execute("""
+            INSERT INTO run_calendar (day, run_count, distance)
+            SELECT date, COUNT(*), SUM(distance) FROM runs GROUP BY date
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS runs_calendar_insert AFTER INSERT ON runs
+            BEGIN
+                INSERT INTO run_calendar (day, run_count, distance) VALUES (new.date, 1, new.distance)
+                ON CONFLICT(day) DO UPDATE SET run_count = run_count + 1, distance = distance + excluded.distance;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS runs_calendar_delete AFTER DELETE ON runs
+            BEGIN
+                UPDATE run_calendar SET run_count = run_count - 1, distance = distance - old.distance WHERE day = old.date;
+                DELETE FROM run_calendar WHERE day = old.date AND run_count <= 0;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS runs_calendar_update AFTER UPDATE OF date, distance ON runs
+            BEGIN
+                UPDATE run_calendar SET run_count = run_count - 1, distance = distance - old.distance WHERE day = old.date;
+                DELETE FROM run_calendar WHERE day = old.date AND run_count <= 0;
+                INSERT INTO run_calendar (day, run_count, distance) VALUES (new.date, 1, new.distance)
+                ON CONFLICT(day) DO UPDATE SET run_count = run_count + 1, distance = distance + excluded.distance;
+            END
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def ensure_change_log(conn):
+    """Creates the change log table and the triggers that record every change to 'runs'.
+
+    Each run has one row holding the sequence number of its latest insert, update or
+    delete, with deleted runs kept as tombstones, so incremental backups can find
+    everything that changed since a given sequence number. Existing runs are logged
+    with sequence number 0 the first time. Called from init_db only.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'run_changes'").fetchone()
+    if exists:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS run_changes (
+                run_id INTEGER PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                deleted INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS run_changes_seq ON run_changes (seq)")
+        conn.execute("INSERT OR IGNORE INTO run_changes (run_id, seq, deleted) SELECT id, 0, 0 FROM runs")
+        for name, event, row in (('insert', 'INSERT', 'new'), ('update', 'UPDATE', 'new'), ('delete', 'DELETE', 'old')):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS runs_changes_{name} AFTER {event} ON runs
+                BEGIN
+                    INSERT INTO run_changes (run_id, seq, deleted)
+                    VALUES ({row}.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM run_changes), {int(event == 'DELETE')})
+                    ON CONFLICT(run_id) DO UPDATE SET seq = excluded.seq, deleted = excluded.deleted;
+                END
+            """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def get_change_seq(conn):
+    """Returns the sequence number of the latest change to 'runs', or None if the change log does not exist."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'run_changes'").fetchone()
+    if not exists:
+        return None
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM run_changes").fetchone()[0]
+
+def add_run(date, distance, time, pace, notes):
+    """Inserts a new run record and returns its ID."""
+    with connect_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO runs (date, distance, time, pace, notes)
+            VALUES (?, ?, ?, ?, ?)
+        """, (date, distance, time, pace, notes))
+        conn.commit()
+        return cursor.lastrowid
 
 def delete_run(run_id):
     """Deletes a run record from the database by its ID."""
@@ -64,6 +200,100 @@ def update_run(run_id, date, distance, time, pace, notes):
         conn.commit()
         return cursor.rowcount > 0
 
+def build_run_filter(ids=None, id_range=None, start_date=None, end_date=None):
+    """Builds a WHERE clause and its parameters selecting runs by ID list, ID range and/or date range.
+
+    Raises ValueError if no filter is given, so a bulk operation can never match every run by accident.
+    """
+    clauses = []
+    params = []
+    if ids:
+        # A single JSON parameter avoids SQLite's limit on the number of bound variables.
+        clauses.append("id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(ids)))
+    if id_range:
+        clauses.append("id BETWEEN ? AND ?")
+        params.extend(id_range)
+    if start_date:
+        clauses.append("date >= ?")
+        params.append(start_date)
+    if end_date:
+        clauses.append("date <= ?")
+        params.append(end_date)
+    if not clauses:
+        raise ValueError("At least one run filter is required.")
+    return " AND ".join(clauses), params
+
+def count_runs(where, params):
+    """Counts the runs matching a WHERE clause built by build_run_filter."""
+    with connect_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM runs WHERE {where}", params)
+        return cursor.fetchone()[0]
+
+def delete_runs(where, params, dry_run=False):
+    """Deletes all runs matching a WHERE clause in a single statement.
+
+    Returns the number of runs deleted, or that would be deleted if dry_run is set.
+    """
+    if dry_run:
+        return count_runs(where, params)
+    with connect_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"DELETE FROM runs WHERE {where}", params)
+        conn.commit()
+        return cursor.rowcount
+
+def bulk_update_runs(where, params, recompute_pace=False, shift_days=0, dry_run=False):
+    """Applies field corrections to all runs matching a WHERE clause in a single statement.
+
+    recompute_pace sets pace to time/distance for runs with a positive distance, and
+    shift_days moves each run's date by that many days. Returns the number of runs
+    updated, or that would be updated if dry_run is set.
+    """
+    assignments = []
+    assignment_params = []
+    applicable = []
+    if recompute_pace:
+        assignments.append("pace = CASE WHEN distance > 0 THEN (time / 60.0) / distance ELSE pace END")
+        applicable.append("distance > 0")
+    if shift_days:
+        assignments.append("date = COALESCE(date(date, ?), date)") # Leave dates SQLite cannot parse untouched
+        assignment_params.append(f"{shift_days:+d} days")
+        applicable.append("date(date) IS NOT NULL")
+    if not assignments:
+        return 0
+
+    full_where = f"({where}) AND ({' OR '.join(applicable)})"
+    if dry_run:
+        return count_runs(full_where, params)
+    with connect_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"UPDATE runs SET {', '.join(assignments)} WHERE {full_where}", assignment_params + list(params))
+        conn.commit()
+        return cursor.rowcount
+
+def get_runs_after_id(last_id, limit):
+    """Fetches up to `limit` runs with an ID greater than `last_id`, ordered by ID."""
+    with connect_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, date, distance, time, pace, notes FROM runs WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit))
+        return cursor.fetchall()
+
+def get_run_days(start_date, end_date):
+    """Fetches the calendar days with runs within a date range, with their run count and distance."""
+    with connect_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT day, run_count, distance FROM run_calendar WHERE day BETWEEN ? AND ? ORDER BY day", (start_date, end_date))
+        return cursor.fetchall()
+
+def get_first_run_day():
+    """Retrieves the earliest well-formed calendar day with a run, or None if there are no runs."""
+    with connect_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MIN(day) FROM run_calendar WHERE date(day) = day")
+        return cursor.fetchone()[0]
+
 def get_monthly_summary():
     """Retrieves total distance and time for each month."""
     with connect_db() as conn:
@@ -0,0 +1,126 @@
+import datetime
+import os
+import pathlib
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+from .database import connect_db, get_db_path
+from .utils import convert_to_db_date
+
+CHUNK_SIZE = 50000  # Runs checked per worker task
+REPAIR_BATCH_SIZE = 1000  # Fixes applied per transaction
+PACE_TOLERANCE = 0.01  # Minutes per km a stored pace may differ from time/distance
+MIN_DISTANCE = 0.1  # Shortest plausible run in km
+MAX_DISTANCE = 250.0  # Longest plausible run in km (single-stage ultramarathons)
+MAX_TIME = 48 * 3600  # Longest plausible run in seconds
+MIN_PACE = 1.5  # Fastest plausible pace in minutes per km (faster than any world record)
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _is_db_date(date_str):
+    """Returns True if the date is a valid, zero-padded YYYY-MM-DD string."""
+    try:
+        return datetime.datetime.strptime(date_str, '%Y-%m-%d').strftime('%Y-%m-%d') == date_str
+    except (TypeError, ValueError):
+        return False
+
+def check_run(run_id, date, distance, time, pace):
+    """Checks a single run and returns a list of (run_id, problem, fixes, checked) tuples.
+
+    fixes maps column names to corrected values, or is None if the problem cannot be
+    repaired automatically. checked holds the values the fixes were computed from, so
+    a repair can skip runs that changed since they were checked.
+    """
+    issues = []
+    checked = {'date': date, 'distance': distance, 'time': time, 'pace': pace}
+
+    if not _is_db_date(date):
+        fixed_date = convert_to_db_date(date) if isinstance(date, str) else None
+        if fixed_date != date and _is_db_date(fixed_date):
+            issues.append((run_id, f"malformed date {date!r}", {'date': fixed_date}, checked))
+        else:
+            issues.append((run_id, f"malformed date {date!r}", None, checked))
+
+    valid_distance = _is_number(distance) and distance > 0
+    valid_time = isinstance(time, int) and time > 0
+    if not valid_distance:
+        issues.append((run_id, f"impossible distance {distance!r}", None, checked))
+    if not valid_time:
+        issues.append((run_id, f"impossible time {time!r}", None, checked))
+
+    if valid_distance and not MIN_DISTANCE <= distance <= MAX_DISTANCE:
+        issues.append((run_id, f"implausible distance {distance:.3f} km (expected {MIN_DISTANCE}-{MAX_DISTANCE} km)", None, checked))
+    if valid_time and time > MAX_TIME:
+        issues.append((run_id, f"implausible time {time} s (longer than {MAX_TIME // 3600} hours)", None, checked))
+
+    if valid_distance and valid_time:
+        expected_pace = (time / 60) / distance
+        if expected_pace < MIN_PACE:
+            issues.append((run_id, f"implausible pace {expected_pace:.2f} min/km (faster than {MIN_PACE} min/km)", None, checked))
+        if not _is_number(pace):
+            issues.append((run_id, f"missing pace {pace!r}", {'pace': expected_pace}, checked))
+        elif abs(pace - expected_pace) > PACE_TOLERANCE:
+            issues.append((run_id, f"pace {pace:.2f} does not match time/distance {expected_pace:.2f}", {'pace': expected_pace}, checked))
+
+    return issues
+
+def check_chunk(db_path, start_id, end_id):
+    """Checks all runs with IDs in [start_id, end_id] on a read-only connection."""
+    conn = sqlite3.connect(pathlib.Path(db_path).as_uri() + '?mode=ro', uri=True)
+    try:
+        issues = []
+        cursor = conn.execute("SELECT id, date, distance, time, pace FROM runs WHERE id BETWEEN ? AND ?", (start_id, end_id))
+        for run_id, date, distance, time, pace in cursor:
+            issues.extend(check_run(run_id, date, distance, time, pace))
+        return issues
+    finally:
+        conn.close()
+
+def check_database(workers=None, chunk_size=CHUNK_SIZE):
+    """Checks every run in ID-range chunks across a process pool and returns all issues found."""
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1.")
+    if workers is not None and workers < 1:
+        raise ValueError("workers must be at least 1.")
+    db_path = get_db_path()
+    conn = connect_db()
+    try:
+        min_id, max_id = conn.execute("SELECT MIN(id), MAX(id) FROM runs").fetchone()
+    finally:
+        conn.close()
+    if min_id is None:
+        return []
+
+    ranges = [(start, min(start + chunk_size - 1, max_id)) for start in range(min_id, max_id + 1, chunk_size)]
+    if len(ranges) == 1 or workers == 1:
+        # Not worth starting worker processes
+        return [issue for start, end in ranges for issue in check_chunk(db_path, start, end)]
+
+    issues = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for chunk_issues in executor.map(check_chunk, [db_path] * len(ranges), *zip(*ranges)):
+            issues.extend(chunk_issues)
+    return issues
+
+def repair_issues(issues, batch_size=REPAIR_BATCH_SIZE):
+    """Applies the automatic fixes of the given issues in batched transactions.
+
+    A fix is skipped if the run changed since it was checked. Returns the number of fixes applied.
+    """
+    fixes = [(run_id, column, value, checked) for run_id, _, run_fixes, checked in issues if run_fixes for column, value in run_fixes.items()]
+    applied = 0
+    conn = connect_db()
+    try:
+        for i in range(0, len(fixes), batch_size):
+            batch = fixes[i:i + batch_size]
+            with conn:
+                date_params = [(value, run_id, checked['date'], checked['pace']) for run_id, column, value, checked in batch if column == 'date']
+                if date_params:
+                    applied += conn.executemany("UPDATE runs SET date = ? WHERE id = ? AND date = ? AND pace IS ?", date_params).rowcount
+                pace_params = [(value, run_id, checked['time'], checked['distance'], checked['pace']) for run_id, column, value, checked in batch if column == 'pace']
+                if pace_params:
+                    applied += conn.executemany("UPDATE runs SET pace = ? WHERE id = ? AND time = ? AND distance = ? AND pace IS ?", pace_params).rowcount
+    finally:
+        conn.close()
+    return applied
@@ -1,5 +1,6 @@
 import sqlite3
-from .database import connect_db, get_monthly_summary, get_fastest_run_for_distance, get_last_n_runs
+import datetime
+from .database import connect_db, get_monthly_summary, get_fastest_run_for_distance, get_last_n_runs, get_run_days, get_first_run_day
 
 def get_total_distance():
     """Calculates the total distance of all logged runs."""
@@ -103,3 +104,95 @@ def compare_runs(run1, run2):
 
     improvement = ((pace2 - pace1) / pace1) * 100
     return improvement
+
+def _parse_day(day):
+    """Parses a calendar day, returning None for malformed dates."""
+    try:
+        return datetime.date.fromisoformat(day)
+    except (TypeError, ValueError):
+        return None
+
+def get_day_bitmap(start_date, end_date):
+    """Returns an integer bitmap of the days with runs between two dates.
+
+    Bit i is set when there was a run i days before end_date.
+    """
+    bitmap = 0
+    for row in get_run_days(start_date.isoformat(), end_date.isoformat()):
+        day = _parse_day(row['day'])
+        if day is not None:
+            bitmap |= 1 << (end_date - day).days
+    return bitmap
+
+def _week_bitmap(day_bitmap, end_date):
+    """Folds a day bitmap into a week bitmap where bit i is the i-th week (Monday to Sunday) before end_date's week."""
+    # Pad so bit 0 is the Sunday of end_date's week, making every 7-bit group one calendar week.
+    bitmap = day_bitmap << (6 - end_date.weekday())
+    weeks = 0
+    week = 0
+    while bitmap:
+        if bitmap & 0x7F:
+            weeks |= 1 << week
+        bitmap >>= 7
+        week += 1
+    return weeks
+
+def _trailing_streak(bitmap):
+    """Length of the run of set bits starting at bit 0, allowing bit 0 itself to be still unset."""
+    if not bitmap & 1:
+        bitmap >>= 1 # Today (or this week) is not over yet
+    return (bitmap ^ (bitmap + 1)).bit_length() - 1
+
+def _longest_streak(bitmap):
+    """Length of the longest run of consecutive set bits."""
+    length = 0
+    while bitmap:
+        bitmap &= bitmap >> 1
+        length += 1
+    return length
+
+def get_streaks(today=None):
+    """Calculates current and longest daily and weekly streaks, and the longest gap between runs."""
+    today = today or datetime.date.today()
+    first_day = _parse_day(get_first_run_day())
+    if first_day is None or first_day > today:
+        return None
+
+    days = get_day_bitmap(first_day, today)
+    span = (today - first_day).days + 1
+    last_run_offset = (days & -days).bit_length() - 1 # Lowest set bit is the most recent run
+    gaps = ~days & ((1 << span) - 1) & ~((1 << last_run_offset) - 1) # Idle days between the first and last run
+    weeks = _week_bitmap(days, today)
+
+    return {
+        'current_streak': _trailing_streak(days),
+        'longest_streak': _longest_streak(days),
+        'current_weekly_streak': _trailing_streak(weeks),
+        'longest_weekly_streak': _longest_streak(weeks),
+        'longest_gap': _longest_streak(gaps),
+    }
+
+def get_heatmap(year):
+    """Builds a 7 x N matrix of distance run per day for a year.
+
+    Rows are weekdays (Monday first) and columns are weeks starting on the Monday on or
+    before 1 January. Days outside the year are None.
+    """
+    first = datetime.date(year, 1, 1)
+    last = datetime.date(year, 12, 31)
+    grid_start = first - datetime.timedelta(days=first.weekday())
+    num_weeks = (last - grid_start).days // 7 + 1
+
+    matrix = [[None] * num_weeks for _ in range(7)]
+    day = first
+    while day <= last:
+        offset = (day - grid_start).days
+        matrix[offset % 7][offset // 7] = 0.0
+        day += datetime.timedelta(days=1)
+
+    for row in get_run_days(first.isoformat(), last.isoformat()):
+        day = _parse_day(row['day'])
+        if day is not None:
+            offset = (day - grid_start).days
+            matrix[offset % 7][offset // 7] = row['distance']
+    return matrix